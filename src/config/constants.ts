@@ -1,3 +1,5 @@
+import type { LogLevel } from '../types/index.js';
+
 export const SELECTORS = {
   VIDEO_TITLE: 'h1.ytd-watch-metadata yt-formatted-string',
   VIDEO_ELEMENT: 'video',
@@ -67,5 +69,37 @@ export const TIMING = {
   POT_TOKEN_TIMEOUT: 2000,
   POT_TOKEN_CHECK_INTERVAL: 100,
   VIDEO_BUFFER_TIME: 0.5,
-  UI_TRANSITION_DELAY: 500
-};
\ No newline at end of file
+  UI_TRANSITION_DELAY: 500,
+  // How long a video without subtitles is skipped before its page is fetched again
+  UNAVAILABLE_SUBTITLES_TTL: 24 * 60 * 60 * 1000,
+  // Caption track URLs are signed and expire, so prefetched metadata is only reused this long
+  CAPTION_METADATA_TTL: 10 * 60 * 1000
+};
+
+export const VOCAB_EXTRACTION = {
+  MODEL: 'gpt-4o-mini',
+  // Bump when the prompt changes so cached extraction results are not reused
+  PROMPT_VERSION: 'v2',
+  // Number of subtitle segments sent to OpenAI in a single request
+  BATCH_SIZE: 10,
+  // Batches of upcoming segments extracted ahead of time
+  LOOKAHEAD_BATCHES: 3,
+  MAX_CONCURRENT_REQUESTS: 3,
+  // Retries when a response fails validation; waits RETRY_BACKOFF_MS * attempt in between
+  MAX_VALIDATION_RETRIES: 2,
+  RETRY_BACKOFF_MS: 1000,
+  // Cached extraction results older than this are evicted so the cache can't fill the storage quota
+  CACHE_MAX_AGE: 30 * 24 * 60 * 60 * 1000,
+  // Minimum time between full scans for expired extraction results
+  CACHE_PRUNE_INTERVAL: 24 * 60 * 60 * 1000
+};
+
+export const SUBTITLE_SEGMENTS = {
+  // Consecutive subtitle lines are merged until a sentence ends or the text reaches this length
+  MAX_SEGMENT_CHARS: 200
+};
+
+export const LOGGING = {
+  // Set to 'debug' to see API responses and subtitle parsing details
+  LEVEL: 'info' as LogLevel
+};
@@ -1,13 +1,17 @@
 import browser from 'webextension-polyfill';
 
 export class ApiKeyManager {
+  // In-memory copy so every API request doesn't hit browser storage
+  private static cachedKey: string | null = null;
+  private static isWatchingStorage = false;
+
   static async ensureOpenAIKey(): Promise<string | null> {
     // Try to get existing key from browser storage
-    const result = await browser.storage.sync.get(['openai_api_key']);
+    const storedKey = await ApiKeyManager.getStoredKey();
 
-    if (result.openai_api_key) {
+    if (storedKey) {
       console.log('OpenAI API key found in storage');
-      return result.openai_api_key;
+      return storedKey;
     }
 
     // Prompt user for API key
@@ -36,14 +40,36 @@ export class ApiKeyManager {
 
   static async storeKey(apiKey: string): Promise<void> {
     await browser.storage.sync.set({ 'openai_api_key': apiKey });
+    ApiKeyManager.cachedKey = apiKey;
   }
 
   static async getStoredKey(): Promise<string | null> {
+    if (ApiKeyManager.cachedKey) {
+      return ApiKeyManager.cachedKey;
+    }
+
+    ApiKeyManager.watchStorageChanges();
     const result = await browser.storage.sync.get(['openai_api_key']);
-    return result.openai_api_key || null;
+    ApiKeyManager.cachedKey = result.openai_api_key || null;
+    return ApiKeyManager.cachedKey;
   }
 
   static async clearKey(): Promise<void> {
     await browser.storage.sync.remove(['openai_api_key']);
+    ApiKeyManager.cachedKey = null;
+  }
+
+  /**
+   * Drop the in-memory key when it is changed elsewhere (other tab, browser sync)
+   */
+  private static watchStorageChanges(): void {
+    if (ApiKeyManager.isWatchingStorage) return;
+    ApiKeyManager.isWatchingStorage = true;
+
+    browser.storage.onChanged.addListener((changes, areaName) => {
+      if (areaName === 'sync' && 'openai_api_key' in changes) {
+        ApiKeyManager.cachedKey = null;
+      }
+    });
   }
-}
\ No newline at end of file
+}
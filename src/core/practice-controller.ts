@@ -1,16 +1,30 @@
 import { PracticeStateMachine, PracticeMode, type PracticeState } from './practice-state-machine.js';
-import { SubtitleExtractor } from './subtitle-extractor.js';
+import { SubtitleExtractor, KNOWN_UNAVAILABLE_MESSAGE, type CaptionMetadataOptions } from './subtitle-extractor.js';
 import { VideoController } from './video-controller.js';
-import { VocabExtractor } from './vocab-extractor.js';
+import { VocabExtractor, type SubtitleSegment } from './vocab-extractor.js';
 import { FSRSCardManager } from './fsrs-card-manager.js';
 import { ApiKeyManager } from './api-key-manager.js';
 import { waitForElement } from '../utils/dom-utils.js';
 import { YouTubeHelpers } from '../utils/youtube-helpers.js';
+import { VOCAB_EXTRACTION, TIMING } from '../config/constants.js';
 import browser from 'webextension-polyfill';
-import type { VocabItem, CaptionTrack } from '../types/index.js';
+import type { VocabItem, CaptionTrack, CaptionMetadata } from '../types/index.js';
 
 const SUBTITLE_SELECTION_CANCELLED = 'USER_CANCELLED_SUBTITLE_SELECTION';
 
+/**
+ * Flashcard state for the segment being practiced. Replaced as a whole on segment change,
+ * so async work started for an older segment can detect that it is stale.
+ */
+interface SegmentPracticeSession {
+  videoId: string;
+  segmentIndex: number;
+  currentVocab: VocabItem | null;
+  currentVocabStatus: 'NEW' | 'DUE' | null;
+  isFlashcardRevealed: boolean;
+  lastPickedVocabOriginal: string | null;
+}
+
 export class PracticeController {
   private stateMachine: PracticeStateMachine | null = null;
   private subtitleExtractor: SubtitleExtractor;
@@ -19,15 +33,11 @@ export class PracticeController {
   private cardManager: FSRSCardManager;
   private originalVideoContainer: HTMLElement | null = null;
   private practiceContainer: HTMLElement | null = null;
-  private currentVocab: VocabItem | null = null;
-  private currentVocabStatus: 'NEW' | 'DUE' | null = null;
-  private isFlashcardRevealed: boolean = false;
-  private lastPickedVocabOriginal: string | null = null;
+  private segmentSession: SegmentPracticeSession | null = null;
   private practiceEnded: boolean = false;
   private preservedEvaluationText: string = '';
-  private currentVideoId: string | null = null;
-  private currentSegmentIndex: number | null = null;
   private subtitleSelectionOverlay: HTMLDivElement | null = null;
+  private captionMetadataPrefetch: { videoId: string; fetchedAt: number; promise: Promise<CaptionMetadata> } | null = null;
 
   constructor() {
     this.subtitleExtractor = new SubtitleExtractor();
@@ -41,6 +51,7 @@ export class PracticeController {
     this.resetAllState();
     this.stateMachine = null;
     this.practiceEnded = false;
+    this.captionMetadataPrefetch = null;
   }
 
   async initialize(): Promise<void> {
@@ -142,9 +153,19 @@ export class PracticeController {
 
       button.addEventListener('click', () => this.handleStartPractice());
 
+      // Start loading caption metadata once the user shows intent, so it is ready when practice starts
+      const prefetchOnIntent = (): void => {
+        const videoId = YouTubeHelpers.getVideoId();
+        if (videoId) {
+          this.prefetchCaptionMetadata(videoId);
+        }
+      };
+      button.addEventListener('pointerdown', prefetchOnIntent);
+
       // Add hover effect
       button.addEventListener('mouseenter', () => {
         button.style.background = '#e5e5e5';
+        prefetchOnIntent();
       });
       button.addEventListener('mouseleave', () => {
         button.style.background = '#f1f1f1';
@@ -187,9 +208,13 @@ export class PracticeController {
           throw new Error('Could not determine current video ID');
         }
 
-        const { captionTracks, defaultAudioLanguage } = await this.subtitleExtractor.getCaptionMetadata(videoId);
+        const { captionTracks, defaultAudioLanguage } = await this.getCaptionMetadata(videoId);
         const selectedTrack = await this.chooseSubtitleTrack(videoId, captionTracks, defaultAudioLanguage);
-        const subtitles = await this.subtitleExtractor.fetchSubtitlesForTrack(selectedTrack);
+        const subtitles = await this.subtitleExtractor.fetchSubtitlesForTrack(selectedTrack).catch((error) => {
+          // The track URL may have expired; fetch fresh metadata on the next attempt
+          this.captionMetadataPrefetch = null;
+          throw error;
+        });
 
         if (!subtitles || subtitles.length === 0) {
           throw new Error('No subtitles found for this video. Please make sure the video has subtitles enabled.');
@@ -224,6 +249,37 @@ export class PracticeController {
     }
   }
 
+  private prefetchCaptionMetadata(videoId: string, options: CaptionMetadataOptions = {}): void {
+    const prefetch = this.captionMetadataPrefetch;
+    const isFresh = prefetch?.videoId === videoId && Date.now() - prefetch.fetchedAt < TIMING.CAPTION_METADATA_TTL;
+    if (isFresh && !options.ignoreUnavailableMarker) return;
+
+    const promise = this.subtitleExtractor.getCaptionMetadata(videoId, options);
+    this.captionMetadataPrefetch = { videoId, fetchedAt: Date.now(), promise };
+
+    // Failures are surfaced when practice starts; forget them so the next attempt refetches
+    promise.catch((error) => {
+      console.log('[Practice Controller] Caption metadata prefetch failed:', error);
+      if (this.captionMetadataPrefetch?.promise === promise) {
+        this.captionMetadataPrefetch = null;
+      }
+    });
+  }
+
+  private async getCaptionMetadata(videoId: string): Promise<CaptionMetadata> {
+    this.prefetchCaptionMetadata(videoId);
+
+    try {
+      return await this.captionMetadataPrefetch!.promise;
+    } catch (error) {
+      if ((error as Error).message !== KNOWN_UNAVAILABLE_MESSAGE) throw error;
+
+      // The user explicitly asked to practice, so check the page again despite the marker
+      this.prefetchCaptionMetadata(videoId, { ignoreUnavailableMarker: true });
+      return this.captionMetadataPrefetch!.promise;
+    }
+  }
+
   private resetStartPracticeButton(): void {
     const button = document.querySelector('.youtube-practice-button') as HTMLButtonElement;
     if (button) {
@@ -509,13 +565,19 @@ export class PracticeController {
     }
 
     // Check if we moved to a new segment
-    const isNewSegment = this.currentVideoId !== videoId || this.currentSegmentIndex !== state.currentSubtitleIndex;
-
-    if (isNewSegment) {
-      // Reset state for new segment
-      this.currentVideoId = videoId;
-      this.currentSegmentIndex = state.currentSubtitleIndex;
-      this.lastPickedVocabOriginal = null;
+    let session = this.segmentSession;
+
+    if (!session || session.videoId !== videoId || session.segmentIndex !== state.currentSubtitleIndex) {
+      // Start fresh state for new segment
+      session = {
+        videoId,
+        segmentIndex: state.currentSubtitleIndex,
+        currentVocab: null,
+        currentVocabStatus: null,
+        isFlashcardRevealed: false,
+        lastPickedVocabOriginal: null
+      };
+      this.segmentSession = session;
       
       try {
         // Ensure vocabulary exists for this segment (extract if needed)
@@ -523,12 +585,14 @@ export class PracticeController {
         
         // Check if segment has any vocabulary at all
         const hasVocab = await this.cardManager.hasAvailableVocabInSegment(videoId, state.currentSubtitleIndex);
+        if (this.segmentSession !== session) return; // Practice ended or moved on while extracting
         if (!hasVocab) {
           this.showNothingToPracticeScreen();
           return;
         }
       } catch (error) {
         console.error('Error ensuring segment vocabulary:', error as Error);
+        if (this.segmentSession !== session) return;
         this.stateMachine!.moveToAutoplay();
         return;
       }
@@ -538,8 +602,9 @@ export class PracticeController {
     const nextVocab = await this.cardManager.getNextAvailableVocabForSegment(
       videoId, 
       state.currentSubtitleIndex, 
-      this.lastPickedVocabOriginal || undefined
+      session.lastPickedVocabOriginal || undefined
     );
+    if (this.segmentSession !== session) return;
 
     if (!nextVocab) {
       // No more vocabulary to show, show "nothing to practice" screen
@@ -549,14 +614,14 @@ export class PracticeController {
 
     // Set current vocabulary info
     const cardStatus = await this.cardManager.getCardStatus(nextVocab);
-    this.currentVocabStatus = cardStatus === 'NOT_DUE' ? null : cardStatus;
-    this.lastPickedVocabOriginal = nextVocab.original;
+    session.currentVocabStatus = cardStatus === 'NOT_DUE' ? null : cardStatus;
+    session.lastPickedVocabOriginal = nextVocab.original;
 
-    if (this.currentVocabStatus === 'NEW') {
+    if (session.currentVocabStatus === 'NEW') {
       // Create new FSRS card for NEW vocabulary
-      this.currentVocab = await this.cardManager.createCard(nextVocab);
-      this.isFlashcardRevealed = true; // NEW cards show front+back immediately
-    } else if (this.currentVocabStatus === 'DUE') {
+      session.currentVocab = await this.cardManager.createCard(nextVocab);
+      session.isFlashcardRevealed = true; // NEW cards show front+back immediately
+    } else if (session.currentVocabStatus === 'DUE') {
       // Get fresh vocabulary with FSRS data from global cache for DUE cards
       const freshVocab = await this.cardManager.getFreshVocabWithFSRSData(nextVocab.original);
       if (!freshVocab) {
@@ -564,9 +629,10 @@ export class PracticeController {
         await this.moveToNextCard();
         return;
       }
-      this.currentVocab = await this.cardManager.markVocabAsPicked(freshVocab);
-      this.isFlashcardRevealed = false; // DUE cards start with reveal flow
+      session.currentVocab = await this.cardManager.markVocabAsPicked(freshVocab);
+      session.isFlashcardRevealed = false; // DUE cards start with reveal flow
     }
+    if (this.segmentSession !== session) return;
 
     // Replace video with flashcard UI
     this.replaceVideoWithFlashcard();
@@ -581,11 +647,35 @@ export class PracticeController {
     const existingVocab = await this.cardManager.cacheManager.getSegmentVocabulary(videoId, segmentIndex);
     
     if (!existingVocab || existingVocab.length === 0) {
-      // Extract vocabulary using existing extraction logic
-      await this.vocabExtractor.extractVocabulary(subtitleText, 'auto', videoId, segmentIndex);
+      // Extract vocabulary for this segment together with the upcoming uncached ones
+      const segments = await this.collectSegmentsForExtraction(videoId, segmentIndex, subtitleText);
+      await this.vocabExtractor.extractVocabularyForSegments(segments, 'auto', videoId);
     }
   }
 
+  /**
+   * Collect the current segment plus the uncached segments within the lookahead window after it
+   */
+  private async collectSegmentsForExtraction(videoId: string, segmentIndex: number, subtitleText: string): Promise<SubtitleSegment[]> {
+    const subtitles = this.stateMachine?.getSubtitles() || [];
+    const windowEnd = Math.min(subtitles.length, segmentIndex + VOCAB_EXTRACTION.BATCH_SIZE * VOCAB_EXTRACTION.LOOKAHEAD_BATCHES);
+
+    const followingIndices: number[] = [];
+    for (let i = segmentIndex + 1; i < windowEnd; i++) {
+      followingIndices.push(i);
+    }
+
+    // One storage read for the whole window
+    const cachedIndices = await this.cardManager.cacheManager.getCachedSegmentIndices(videoId, followingIndices);
+
+    return [
+      { index: segmentIndex, text: subtitleText },
+      ...followingIndices
+        .filter(index => !cachedIndices.has(index))
+        .map(index => ({ index, text: subtitles[index].text }))
+    ];
+  }
+
   private replaceVideoWithFlashcard(): void {
     // Pause the video but keep it visible
     this.videoController.pause();
@@ -598,7 +688,7 @@ export class PracticeController {
       document.body.appendChild(this.practiceContainer);
     }
 
-    if (!this.currentVocab) return;
+    if (!this.segmentSession?.currentVocab) return;
 
     // Build content based on card status and reveal state
     const content = this.buildFlashcardContent();
@@ -623,16 +713,17 @@ export class PracticeController {
   }
 
   private buildFlashcardContent(): string {
-    if (!this.currentVocab) return '';
+    const currentVocab = this.segmentSession?.currentVocab;
+    if (!currentVocab) return '';
 
-    if (!this.isFlashcardRevealed) {
+    if (!this.segmentSession!.isFlashcardRevealed) {
       // Show only front (for DUE cards)
-      return `<div style="${this.getForeignTextStyle()}">${this.currentVocab.original}</div>`;
+      return `<div style="${this.getForeignTextStyle()}">${currentVocab.original}</div>`;
     } else {
       // Show front+back (for NEW cards immediately, DUE cards after reveal)
-      const translations = this.currentVocab.translations.join(', ');
+      const translations = currentVocab.translations.join(', ');
       return `
-        <div style="${this.getForeignTextStyle()}">${this.currentVocab.original}</div>
+        <div style="${this.getForeignTextStyle()}">${currentVocab.original}</div>
         <hr style="${this.getDividerStyle()}">
         <div style="${this.getTranslationTextStyle()}">${translations}</div>
       `;
@@ -640,11 +731,14 @@ export class PracticeController {
   }
 
   private buildFlashcardButtons(): string {
-    if (this.currentVocabStatus === 'NEW') {
+    const session = this.segmentSession;
+    if (!session) return '';
+
+    if (session.currentVocabStatus === 'NEW') {
       // NEW cards: only "I will remember" button
       return `<button class="remember-btn" style="${this.getRememberButtonStyle()}">I will remember</button>`;
-    } else if (this.currentVocabStatus === 'DUE') {
-      if (!this.isFlashcardRevealed) {
+    } else if (session.currentVocabStatus === 'DUE') {
+      if (!session.isFlashcardRevealed) {
         // DUE cards before reveal: "Reveal" button
         return `<button class="flashcard-reveal-btn" style="${this.getRevealButtonStyle()}">Reveal</button>`;
       } else {
@@ -692,7 +786,8 @@ export class PracticeController {
   }
 
   private handleRevealFlashcard(): void {
-    this.isFlashcardRevealed = true;
+    if (!this.segmentSession) return;
+    this.segmentSession.isFlashcardRevealed = true;
     // Just re-render the current flashcard, don't get next card
     this.replaceVideoWithFlashcard();
   }
@@ -706,10 +801,11 @@ export class PracticeController {
 
   private async handleFlashcardRating(rating: number): Promise<void> {
     if (this.practiceEnded) return; // Prevent action after practice ended
-    if (!this.currentVocab) return;
+    const currentVocab = this.segmentSession?.currentVocab;
+    if (!currentVocab) return;
 
     try {
-      await this.cardManager.reviewCard(this.currentVocab, rating);
+      await this.cardManager.reviewCard(currentVocab, rating);
     } catch (error) {
       console.error('Error rating card:', error);
     }
@@ -721,9 +817,11 @@ export class PracticeController {
     if (this.practiceEnded) return; // Prevent action after practice ended
 
     // Reset vocabulary state
-    this.currentVocab = null;
-    this.currentVocabStatus = null;
-    this.isFlashcardRevealed = false;
+    if (this.segmentSession) {
+      this.segmentSession.currentVocab = null;
+      this.segmentSession.currentVocabStatus = null;
+      this.segmentSession.isFlashcardRevealed = false;
+    }
 
     // Try to render next card, or show "nothing to practice" if none left
     await this.renderFlashcardMode(this.stateMachine!.getCurrentState());
@@ -932,12 +1030,7 @@ export class PracticeController {
     this.practiceEnded = true;
 
     // Reset all instance variables to initial state
-    this.currentVocab = null;
-    this.currentVocabStatus = null;
-    this.isFlashcardRevealed = false;
-    this.lastPickedVocabOriginal = null;
-    this.currentVideoId = null;
-    this.currentSegmentIndex = null;
+    this.segmentSession = null;
 
     // Immediate DOM cleanup - don't wait for state machine
     if (this.practiceContainer) {
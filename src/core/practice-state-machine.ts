@@ -1,6 +1,8 @@
 import type { TimedSubtitle } from '../types/index.js';
 import browser from 'webextension-polyfill';
 
+const EVALUATION_KEY_PREFIX = 'practice_evaluation_';
+
 export enum PracticeMode {
   VIDEO_WATCHING = 'VIDEO_WATCHING',
   FLASHCARD_PRACTICE = 'FLASHCARD_PRACTICE',
@@ -37,6 +39,10 @@ export class PracticeStateMachine {
     return { ...this.state };
   }
 
+  getSubtitles(): TimedSubtitle[] {
+    return [...this.subtitles];
+  }
+
   findCurrentSubtitleFromTimestamp(timestamp: number): number {
     for (let i = 0; i < this.subtitles.length; i++) {
       const subtitle = this.subtitles[i];
@@ -93,21 +99,20 @@ export class PracticeStateMachine {
 
   async saveEvaluationAndNext(evaluation: string): Promise<void> {
     if (this.state.mode === PracticeMode.EVALUATION && this.state.currentSubtitle) {
-      // Save to browser storage
+      // Save to browser storage, one entry per evaluation so saving doesn't rewrite all previous ones
       const videoId = new URLSearchParams(window.location.search).get('v');
+      const savedAt = new Date();
       const evaluationData = {
         videoId,
         subtitleIndex: this.state.currentSubtitleIndex,
         timestamp: this.state.videoTimestamp,
         subtitle: this.state.currentSubtitle.text,
         evaluation,
-        savedAt: new Date().toISOString()
+        savedAt: savedAt.toISOString()
       };
 
-      const result = await browser.storage.local.get(['practice_evaluations']);
-      const existingEvaluations = Array.isArray(result.practice_evaluations) ? result.practice_evaluations : [];
-      existingEvaluations.push(evaluationData);
-      await browser.storage.local.set({ practice_evaluations: existingEvaluations });
+      const evaluationKey = `${EVALUATION_KEY_PREFIX}${videoId}_${this.state.currentSubtitleIndex}_${savedAt.getTime()}`;
+      await browser.storage.local.set({ [evaluationKey]: evaluationData });
 
       // Move to next subtitle
       if (this.state.currentSubtitleIndex < this.state.totalSubtitles - 1) {
@@ -1,5 +1,22 @@
 import { YouTubeHelpers } from '../utils/youtube-helpers.js';
-import type { TimedSubtitle, POTTokenManager, CaptionTrack } from '../types/index.js';
+import type { TimedSubtitle, POTTokenManager, CaptionTrack, CaptionMetadata } from '../types/index.js';
+import { SUBTITLE_SEGMENTS, TIMING } from '../config/constants.js';
+import { logger } from '../utils/logger.js';
+import { hasSpokenText } from '../utils/subtitle-text.js';
+import browser from 'webextension-polyfill';
+
+const UNAVAILABLE_KEY_PREFIX = 'subtitles_unavailable_';
+const NO_SUBTITLES_MESSAGE = 'No subtitles found for this video';
+// Thrown without fetching the page when a video was recently found without subtitles
+export const KNOWN_UNAVAILABLE_MESSAGE = 'No subtitles found for this video (checked recently)';
+
+export interface CaptionMetadataOptions {
+  // Fetch the page even if the video was recently found without subtitles
+  ignoreUnavailableMarker?: boolean;
+}
+
+// Sentence-final punctuation (Latin, Arabic, CJK), optionally followed by closing quotes/brackets
+const SENTENCE_END_PATTERN = /[.!?؟。！？…]["'»”)\]]*$/;
 
 export class SubtitleExtractor {
   private tokenManager: POTTokenManager;
@@ -10,11 +27,11 @@ export class SubtitleExtractor {
 
   async extractSubtitles(): Promise<TimedSubtitle[]> {
     try {
-      console.log('getSubtitles called');
-      console.log('Current poToken:', this.tokenManager.getToken());
+      logger.debug('getSubtitles called');
+      logger.debug('Current poToken:', this.tokenManager.getToken());
 
       const videoId = YouTubeHelpers.getVideoId();
-      console.log('Video ID:', videoId);
+      logger.debug('Video ID:', videoId);
 
       if (!videoId) {
         throw new Error('Could not extract video ID');
@@ -23,7 +40,7 @@ export class SubtitleExtractor {
       const { captionTracks, defaultAudioLanguage } = await this.getCaptionMetadata(videoId);
       const selectedTrack = this.selectBestCaptionTrack(captionTracks, defaultAudioLanguage);
 
-      console.log('[SubtitleExtractor] Selected caption track (auto):', {
+      logger.info('[SubtitleExtractor] Selected caption track (auto):', {
         languageCode: selectedTrack.languageCode,
         vssId: selectedTrack.vssId,
         kind: selectedTrack.kind,
@@ -32,36 +49,91 @@ export class SubtitleExtractor {
 
       return await this.fetchSubtitlesForTrack(selectedTrack);
     } catch (error) {
-      console.error('[SubtitleExtractor] Error in getSubtitles:', error);
+      logger.error('[SubtitleExtractor] Error in getSubtitles:', error);
       throw error;
     }
   }
 
-  async getCaptionMetadata(videoId: string): Promise<{ captionTracks: CaptionTrack[]; defaultAudioLanguage: string | null }> {
+  async getCaptionMetadata(videoId: string, options: CaptionMetadataOptions = {}): Promise<CaptionMetadata> {
+    // Videos recently found without subtitles fail fast instead of refetching the page
+    if (!options.ignoreUnavailableMarker && await this.isKnownUnavailable(videoId)) {
+      logger.info('[SubtitleExtractor] Skipping video known to have no subtitles:', videoId);
+      throw new Error(KNOWN_UNAVAILABLE_MESSAGE);
+    }
+
     const html = await YouTubeHelpers.fetchVideoPage(videoId);
     const captionTracks = YouTubeHelpers.extractCaptionTracks(html);
 
     if (!captionTracks || captionTracks.length === 0) {
-      throw new Error('No subtitles found for this video');
+      // Only remember the video when the page proves it has no captions; consent pages,
+      // throttling or changed markup must not hide subtitles that do exist
+      if (!YouTubeHelpers.isPlayableWithoutCaptions(html)) {
+        throw new Error('Could not read caption tracks from the video page');
+      }
+      await this.markUnavailable(videoId);
+      throw new Error(NO_SUBTITLES_MESSAGE);
+    }
+
+    // Captions were added since the video was marked; a live marker can only exist when it was ignored
+    if (options.ignoreUnavailableMarker) {
+      await this.clearUnavailable(videoId);
     }
 
-    console.log('[SubtitleExtractor] Available tracks:', captionTracks.map(t => `${t.languageCode}: ${t.name?.simpleText || 'Unknown'} (${t.kind || 'standard'})`));
+    logger.debug('[SubtitleExtractor] Available tracks:', captionTracks.map(t => `${t.languageCode}: ${t.name?.simpleText || 'Unknown'} (${t.kind || 'standard'})`));
 
     const defaultAudioLanguage = YouTubeHelpers.extractDefaultAudioLanguage(html);
-    console.log('[SubtitleExtractor] Default audio language:', defaultAudioLanguage);
+    logger.info('[SubtitleExtractor] Default audio language:', defaultAudioLanguage);
 
     return { captionTracks, defaultAudioLanguage };
   }
 
+  private async isKnownUnavailable(videoId: string): Promise<boolean> {
+    const key = `${UNAVAILABLE_KEY_PREFIX}${videoId}`;
+
+    try {
+      const result = await browser.storage.local.get([key]);
+      const markedAt = result[key] as string | undefined;
+      if (!markedAt) return false;
+
+      if (Date.now() - new Date(markedAt).getTime() < TIMING.UNAVAILABLE_SUBTITLES_TTL) {
+        return true;
+      }
+
+      // Expired markers are removed so they don't pile up for every video without subtitles
+      await this.clearUnavailable(videoId);
+      return false;
+    } catch (error) {
+      logger.error('[SubtitleExtractor] Error reading subtitle availability:', error);
+      return false;
+    }
+  }
+
+  private async clearUnavailable(videoId: string): Promise<void> {
+    try {
+      await browser.storage.local.remove([`${UNAVAILABLE_KEY_PREFIX}${videoId}`]);
+    } catch (error) {
+      logger.error('[SubtitleExtractor] Error clearing subtitle availability:', error);
+    }
+  }
+
+  private async markUnavailable(videoId: string): Promise<void> {
+    try {
+      await browser.storage.local.set({ [`${UNAVAILABLE_KEY_PREFIX}${videoId}`]: new Date().toISOString() });
+    } catch (error) {
+      logger.error('[SubtitleExtractor] Error saving subtitle availability:', error);
+      // Non-fatal error, the page is simply fetched again next time
+    }
+  }
+
   async fetchSubtitlesForTrack(track: CaptionTrack): Promise<TimedSubtitle[]> {
     if (!this.tokenManager.getToken()) {
-      console.log('No POT token, attempting to get one...');
+      logger.debug('No POT token, attempting to get one...');
       await YouTubeHelpers.toggleUntilPoTokenSet(this.tokenManager);
-      console.log('POT token after toggle:', this.tokenManager.getToken());
+      logger.debug('POT token after toggle:', this.tokenManager.getToken());
     }
 
     const subsUrl = YouTubeHelpers.buildSubtitleUrl(track.baseUrl, this.tokenManager.getToken());
-    console.log('[SubtitleExtractor] Fetching with POT token:', subsUrl.substring(0, 100) + '...');
+    logger.debug('[SubtitleExtractor] Fetching with POT token:', subsUrl.substring(0, 100) + '...');
 
     const subsResponse = await fetch(subsUrl);
     const xmlText = await subsResponse.text();
@@ -70,7 +142,53 @@ export class SubtitleExtractor {
       throw new Error(`Empty response from YouTube API. Status: ${subsResponse.status}`);
     }
 
-    return this.parseSubtitleXML(xmlText);
+    return this.mergeIntoSentenceSegments(this.parseSubtitleXML(xmlText));
+  }
+
+  /**
+   * Merge subtitle lines (auto-generated ones are split every few seconds) into sentence-sized
+   * segments, so practice and vocabulary extraction work on complete sentences
+   */
+  mergeIntoSentenceSegments(subtitles: Iterable<TimedSubtitle>): TimedSubtitle[] {
+    const segments: TimedSubtitle[] = [];
+    let current: TimedSubtitle | null = null;
+    let lineCount = 0;
+
+    for (const subtitle of subtitles) {
+      lineCount++;
+      const text = (subtitle.text || '').trim();
+      if (!text) continue;
+
+      // Sound tags and symbol-only lines stay separate segments, so they never dilute spoken text
+      if (!hasSpokenText(text)) {
+        if (current) {
+          segments.push(current);
+          current = null;
+        }
+        segments.push({ start: subtitle.start, duration: subtitle.duration, text });
+        continue;
+      }
+
+      if (current) {
+        current.text += ' ' + text;
+        current.duration = subtitle.start + subtitle.duration - current.start;
+      } else {
+        current = { start: subtitle.start, duration: subtitle.duration, text };
+      }
+
+      if (current.text.length >= SUBTITLE_SEGMENTS.MAX_SEGMENT_CHARS || SENTENCE_END_PATTERN.test(text)) {
+        segments.push(current);
+        current = null;
+      }
+    }
+
+    if (current) {
+      segments.push(current);
+    }
+
+    logger.info('[SubtitleExtractor] Merged', lineCount, 'subtitle lines into', segments.length, 'segments');
+    logger.debug('[SubtitleExtractor] Timed subtitles (first 5):', segments.slice(0, 5));
+    return segments;
   }
 
   selectBestCaptionTrack(captionTracks: CaptionTrack[], preferredLanguage: string | null): CaptionTrack {
@@ -86,14 +204,17 @@ export class SubtitleExtractor {
     const preferred = normalize(preferredLanguage);
     const preferredBase = preferred?.split('-')[0];
 
-    console.log('[SubtitleExtractor] Preferred language (raw/base):', preferred, preferredBase);
+    logger.debug('[SubtitleExtractor] Preferred language (raw/base):', preferred, preferredBase);
 
-    captionTracks.forEach((track, index) => {
+    // Normalize every track's codes once and reuse them for logging and both match passes
+    const candidates = captionTracks.map(track => {
       const code = normalize(track.languageCode);
       const vss = normalize(track.vssId?.replace(/^\./, ''));
-      const baseCode = code?.split('-')[0];
-      const baseVss = vss?.split('-')[0];
-      console.log('[SubtitleExtractor] Track candidate', index, {
+      return { track, code, vss, baseCode: code?.split('-')[0], baseVss: vss?.split('-')[0] };
+    });
+
+    candidates.forEach(({ track, code, vss, baseCode, baseVss }, index) => {
+      logger.debug('[SubtitleExtractor] Track candidate', index, {
         languageCode: track.languageCode,
         vssId: track.vssId,
         kind: track.kind,
@@ -106,95 +227,85 @@ export class SubtitleExtractor {
     });
 
     if (!preferred) {
-      console.log('[SubtitleExtractor] No preferred language detected, using first track');
+      logger.debug('[SubtitleExtractor] No preferred language detected, using first track');
       return captionTracks[0];
     }
 
-    const matchByLanguage = captionTracks.find(track => {
-      const code = normalize(track.languageCode);
-      const vss = normalize(track.vssId?.replace(/^\./, ''));
-      const isMatch = code === preferred || vss === preferred;
-      if (isMatch) {
-        console.log('[SubtitleExtractor] Exact language match found:', {
-          languageCode: track.languageCode,
-          vssId: track.vssId,
-          kind: track.kind
-        });
-      }
-      return isMatch;
-    });
+    const matchByLanguage = candidates.find(({ code, vss }) => code === preferred || vss === preferred);
 
     if (matchByLanguage) {
-      return matchByLanguage;
+      logger.debug('[SubtitleExtractor] Exact language match found:', {
+        languageCode: matchByLanguage.track.languageCode,
+        vssId: matchByLanguage.track.vssId,
+        kind: matchByLanguage.track.kind
+      });
+      return matchByLanguage.track;
     }
 
-    const partialMatches = captionTracks.filter(track => {
-      const code = normalize(track.languageCode)?.split('-')[0];
-      const vss = normalize(track.vssId?.replace(/^\./, ''));
-      const baseVss = vss?.split('-')[0];
-      const isPartial = code === preferredBase || baseVss === preferredBase;
-      if (isPartial) {
-        console.log('[SubtitleExtractor] Partial language match candidate:', {
-          languageCode: track.languageCode,
-          vssId: track.vssId,
-          kind: track.kind,
-          normalizedCode: code,
-          normalizedVss: vss
-        });
-      }
-      return isPartial;
+    const partialMatches = candidates.filter(({ baseCode, baseVss }) => baseCode === preferredBase || baseVss === preferredBase);
+
+    partialMatches.forEach(({ track, baseCode, vss }) => {
+      logger.debug('[SubtitleExtractor] Partial language match candidate:', {
+        languageCode: track.languageCode,
+        vssId: track.vssId,
+        kind: track.kind,
+        normalizedCode: baseCode,
+        normalizedVss: vss
+      });
     });
 
     if (partialMatches.length) {
-      const nonAsr = partialMatches.find(track => track.kind !== 'asr');
+      const nonAsr = partialMatches.find(({ track }) => track.kind !== 'asr');
       if (nonAsr) {
-        console.log('[SubtitleExtractor] Using partial match (non-ASR preferred):', {
-          languageCode: nonAsr.languageCode,
-          vssId: nonAsr.vssId,
-          kind: nonAsr.kind
+        logger.debug('[SubtitleExtractor] Using partial match (non-ASR preferred):', {
+          languageCode: nonAsr.track.languageCode,
+          vssId: nonAsr.track.vssId,
+          kind: nonAsr.track.kind
         });
-        return nonAsr;
+        return nonAsr.track;
       }
 
-      console.log('[SubtitleExtractor] Using partial match (only ASR available):', {
-        languageCode: partialMatches[0].languageCode,
-        vssId: partialMatches[0].vssId,
-        kind: partialMatches[0].kind
+      const [firstMatch] = partialMatches;
+      logger.debug('[SubtitleExtractor] Using partial match (only ASR available):', {
+        languageCode: firstMatch.track.languageCode,
+        vssId: firstMatch.track.vssId,
+        kind: firstMatch.track.kind
       });
-      return partialMatches[0];
+      return firstMatch.track;
     }
 
-    console.log('[SubtitleExtractor] No matching tracks found, falling back to first track');
+    logger.debug('[SubtitleExtractor] No matching tracks found, falling back to first track');
     return captionTracks[0];
   }
 
-  parseSubtitleXML(xmlText: string): TimedSubtitle[] {
-    console.log('[SubtitleExtractor] XML response (first 500 chars):', xmlText.substring(0, 500));
+  *parseSubtitleXML(xmlText: string): Generator<TimedSubtitle> {
+    logger.debug('[SubtitleExtractor] XML response (first 500 chars):', xmlText.substring(0, 500));
 
     const parser = new DOMParser();
     const xml = parser.parseFromString(xmlText, 'text/xml');
     const textNodes = xml.getElementsByTagName('text');
 
-    console.log('[SubtitleExtractor] Number of text nodes:', textNodes.length);
+    logger.debug('[SubtitleExtractor] Number of text nodes:', textNodes.length);
 
     if (textNodes.length === 0) {
       throw new Error('No text nodes found in XML');
     }
 
-    console.log('[SubtitleExtractor] First text node:', textNodes[0]);
-    console.log('[SubtitleExtractor] First text attributes:', {
+    logger.debug('[SubtitleExtractor] First text node:', textNodes[0]);
+    logger.debug('[SubtitleExtractor] First text attributes:', {
       start: textNodes[0].getAttribute('start'),
       dur: textNodes[0].getAttribute('dur'),
       text: textNodes[0].textContent
     });
 
-    const timedSubtitles = Array.from(textNodes).map(node => ({
-      start: parseFloat(node.getAttribute('start') || 0),
-      duration: parseFloat(node.getAttribute('dur') || 0),
-      text: node.textContent
-    }));
-
-    console.log('[SubtitleExtractor] Timed subtitles (first 5):', timedSubtitles.slice(0, 5));
-    return timedSubtitles;
+    // Yield lines one by one so they are merged into segments without an intermediate array
+    for (let i = 0; i < textNodes.length; i++) {
+      const node = textNodes[i];
+      yield {
+        start: parseFloat(node.getAttribute('start') || 0),
+        duration: parseFloat(node.getAttribute('dur') || 0),
+        text: node.textContent
+      };
+    }
   }
 }
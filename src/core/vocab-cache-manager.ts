@@ -1,10 +1,29 @@
-import type { VocabItem, SegmentVocabCache } from '../types/index.js';
+import type { VocabItem, SegmentVocabCache, ExtractedVocab, ExtractionCacheEntry } from '../types/index.js';
 import browser from 'webextension-polyfill';
 import type { Card } from 'ts-fsrs';
+import { VOCAB_EXTRACTION } from '../config/constants.js';
 
 export class VocabCacheManager {
-  private segmentCacheKeyPrefix = 'vocab_segment_';
+  // Global vocabulary entries read or written during this page session, shared by all instances.
+  // Kept in sync with storage (including other tabs) through storage.onChanged.
+  private static globalVocabMemo = new Map<string, VocabItem>();
+  private static isWatchingStorage = false;
+  private static legacyCleanupStarted = false;
+  private static extractionPruneStarted = false;
+
+  // v2: segments are merged subtitle lines, so indices differ from the raw-line caches
+  private segmentCacheKeyPrefix = 'vocab_segment_v2_';
+  private legacySegmentCacheKeyPrefix = 'vocab_segment_';
+  private legacyCleanupDoneKey = 'storage_migration_segment_cache_v2';
+  private extractionPrunedAtKey = 'storage_extraction_cache_pruned_at';
   private globalVocabKeyPrefix = 'vocab_global_';
+  private extractionCacheKeyPrefix = 'vocab_extraction_';
+
+  constructor() {
+    this.watchGlobalVocabChanges();
+    this.removeLegacySegmentCaches();
+    this.pruneExtractionCache();
+  }
 
   /**
    * Get cached vocabulary for a specific video segment
@@ -19,15 +38,10 @@ export class VocabCacheManager {
         return null;
       }
 
-      const cache = JSON.parse(result[cacheKey]) as SegmentVocabCache;
+      const cache = this.readStoredValue<SegmentVocabCache>(result[cacheKey]);
       
       // Deserialize FSRS card data if present
-      const vocabulary = cache.vocabulary.map(vocab => ({
-        ...vocab,
-        fsrsCard: vocab.fsrsCard ? this.deserializeCard(vocab.fsrsCard) : undefined
-      }));
-
-      return vocabulary;
+      return cache.vocabulary.map(vocab => this.deserializeVocab(vocab));
     } catch (error) {
       console.error('Error reading segment vocabulary cache:', error);
       // Clear corrupted cache and return null to trigger refetch
@@ -36,29 +50,54 @@ export class VocabCacheManager {
     }
   }
 
+  /**
+   * Return which of the given segments already have cached vocabulary, using a single storage read
+   */
+  async getCachedSegmentIndices(videoId: string, segmentIndices: number[]): Promise<Set<number>> {
+    if (segmentIndices.length === 0) {
+      return new Set();
+    }
+
+    try {
+      const keys = segmentIndices.map(segmentIndex => `${this.segmentCacheKeyPrefix}${videoId}_${segmentIndex}`);
+      const result = await browser.storage.local.get(keys);
+      return new Set(segmentIndices.filter((_, i) => result[keys[i]]));
+    } catch (error) {
+      console.error('Error reading segment vocabulary cache:', error);
+      return new Set();
+    }
+  }
+
   /**
    * Cache vocabulary for a specific video segment
    */
   async cacheSegmentVocabulary(videoId: string, segmentIndex: number, vocabulary: VocabItem[]): Promise<void> {
-    const cacheKey = `${this.segmentCacheKeyPrefix}${videoId}_${segmentIndex}`;
-    
+    await this.cacheSegmentsVocabulary(videoId, new Map([[segmentIndex, vocabulary]]));
+  }
+
+  /**
+   * Cache vocabulary for several segments of a video with a single storage write
+   */
+  async cacheSegmentsVocabulary(videoId: string, vocabularyBySegment: Map<number, VocabItem[]>): Promise<void> {
+    if (vocabularyBySegment.size === 0) {
+      return;
+    }
+
     try {
-      // Serialize FSRS card data
-      const serializedVocabulary = vocabulary.map(vocab => ({
-        ...vocab,
-        fsrsCard: vocab.fsrsCard ? this.serializeCard(vocab.fsrsCard) : undefined
-      }));
-
-      const cache: SegmentVocabCache = {
-        videoId,
-        segmentIndex,
-        vocabulary: serializedVocabulary,
-        timestamp: new Date().toISOString()
-      };
+      const timestamp = new Date().toISOString();
+      const entries: Record<string, unknown> = {};
 
-      await browser.storage.local.set({
-        [cacheKey]: JSON.stringify(cache)
-      });
+      for (const [segmentIndex, vocabulary] of vocabularyBySegment) {
+        // Same shape as SegmentVocabCache, with FSRS card data serialized
+        entries[`${this.segmentCacheKeyPrefix}${videoId}_${segmentIndex}`] = {
+          videoId,
+          segmentIndex,
+          vocabulary: vocabulary.map(vocab => this.serializeVocab(vocab)),
+          timestamp
+        };
+      }
+
+      await browser.storage.local.set(entries);
     } catch (error) {
       console.error('Error caching segment vocabulary:', error);
       // Non-fatal error, continue without caching
@@ -69,6 +108,11 @@ export class VocabCacheManager {
    * Get global vocabulary entry for a specific word
    */
   async getGlobalVocabEntry(original: string): Promise<VocabItem | null> {
+    const memoized = VocabCacheManager.globalVocabMemo.get(original);
+    if (memoized) {
+      return { ...memoized };
+    }
+
     const globalKey = `${this.globalVocabKeyPrefix}${original}`;
     
     try {
@@ -78,13 +122,10 @@ export class VocabCacheManager {
         return null;
       }
 
-      const vocab = JSON.parse(result[globalKey]) as VocabItem;
-      
-      // Deserialize FSRS card data if present
-      return {
-        ...vocab,
-        fsrsCard: vocab.fsrsCard ? this.deserializeCard(vocab.fsrsCard) : undefined
-      };
+      // A write made while reading is newer than what was read
+      const vocab = VocabCacheManager.globalVocabMemo.get(original) || this.deserializeVocab(result[globalKey]);
+      VocabCacheManager.globalVocabMemo.set(original, vocab);
+      return { ...vocab };
     } catch (error) {
       console.error('Error reading global vocabulary entry:', error);
       return null;
@@ -123,14 +164,13 @@ export class VocabCacheManager {
         };
       }
 
-      // Serialize and save
-      const serializedVocab = {
-        ...updatedVocab,
-        fsrsCard: updatedVocab.fsrsCard ? this.serializeCard(updatedVocab.fsrsCard) : undefined
-      };
+      // Update the memo before writing, so concurrent merges build on this entry instead of
+      // overwriting it with the previous FSRS card
+      VocabCacheManager.globalVocabMemo.set(updatedVocab.original, updatedVocab);
 
+      // Serialize and save
       await browser.storage.local.set({
-        [globalKey]: JSON.stringify(serializedVocab)
+        [globalKey]: this.serializeVocab(updatedVocab)
       });
     } catch (error) {
       console.error('Error updating global vocabulary entry:', error);
@@ -139,42 +179,172 @@ export class VocabCacheManager {
   }
 
   /**
-   * Process new vocabulary from API: merge with global cache and return enriched vocabulary
+   * Process new vocabulary from API: merge with global cache and return enriched vocabulary.
+   * All affected global entries are read and written with one storage call each.
    */
-  async processNewVocabulary(newVocabulary: Array<{ original: string; translation: string }>): Promise<VocabItem[]> {
+  async processNewVocabulary(newVocabulary: ExtractedVocab[]): Promise<VocabItem[]> {
+    const translationsByOriginal = this.groupTranslationsByOriginal(newVocabulary);
+    if (translationsByOriginal.size === 0) {
+      return [];
+    }
+
+    // Words already seen in this session (e.g. in a previous video) are served from memory
+    const unknownKeys = [...translationsByOriginal.keys()]
+      .filter(original => !VocabCacheManager.globalVocabMemo.has(original))
+      .map(original => `${this.globalVocabKeyPrefix}${original}`);
+    const storedEntries: Record<string, unknown> = unknownKeys.length > 0 ? await browser.storage.local.get(unknownKeys) : {};
+
+    const created = new Date().toISOString();
     const enrichedVocabulary: VocabItem[] = [];
+    const updatedEntries: Record<string, unknown> = {};
 
-    for (const item of newVocabulary) {
-      // Get existing global entry
-      const existingGlobal = await this.getGlobalVocabEntry(item.original);
-      
-      let vocabItem: VocabItem;
-      
-      if (existingGlobal) {
-        // Merge with existing
-        const mergedTranslations = [...new Set([...existingGlobal.translations, item.translation])];
-        vocabItem = {
-          ...existingGlobal,
-          translations: mergedTranslations
-        };
-      } else {
-        // Create new entry
-        vocabItem = {
-          original: item.original,
-          translations: [item.translation],
-          created: new Date().toISOString()
-        };
-      }
+    for (const [original, translations] of translationsByOriginal) {
+      const globalKey = `${this.globalVocabKeyPrefix}${original}`;
+      const existingGlobal = VocabCacheManager.globalVocabMemo.get(original)
+        || (storedEntries[globalKey] ? this.deserializeVocab(storedEntries[globalKey]) : null);
 
-      // Update global cache
-      await this.updateGlobalVocabEntry(vocabItem);
-      
+      // Merge with existing entry (keeping its FSRS data) or create a new one
+      const vocabItem: VocabItem = existingGlobal
+        ? { ...existingGlobal, translations: [...new Set([...existingGlobal.translations, ...translations])] }
+        : { original, translations: [...translations], created };
+
+      updatedEntries[globalKey] = this.serializeVocab(vocabItem);
       enrichedVocabulary.push(vocabItem);
     }
 
+    // Write-through memo: entries are merged and memoized without awaiting in between, so a
+    // concurrent FSRS review is either included here or merged on top of this result
+    enrichedVocabulary.forEach(vocab => VocabCacheManager.globalVocabMemo.set(vocab.original, vocab));
+
+    try {
+      await browser.storage.local.set(updatedEntries);
+    } catch (error) {
+      console.error('Error updating global vocabulary entries:', error);
+      // Non-fatal error, continue without updating global cache
+    }
+
     return enrichedVocabulary;
   }
 
+  /**
+   * Keep the shared memo in sync with global vocabulary changes made elsewhere
+   */
+  private watchGlobalVocabChanges(): void {
+    if (VocabCacheManager.isWatchingStorage) return;
+    VocabCacheManager.isWatchingStorage = true;
+
+    browser.storage.onChanged.addListener((changes, areaName) => {
+      if (areaName !== 'local') return;
+
+      for (const [key, change] of Object.entries(changes)) {
+        if (!key.startsWith(this.globalVocabKeyPrefix)) continue;
+
+        const original = key.slice(this.globalVocabKeyPrefix.length);
+        if (change.newValue) {
+          VocabCacheManager.globalVocabMemo.set(original, this.deserializeVocab(change.newValue));
+        } else {
+          VocabCacheManager.globalVocabMemo.delete(original);
+        }
+      }
+    });
+  }
+
+  /**
+   * Deduplicate extracted pairs: one entry per trimmed original with its set of translations
+   */
+  private groupTranslationsByOriginal(vocabulary: ExtractedVocab[]): Map<string, Set<string>> {
+    const translationsByOriginal = new Map<string, Set<string>>();
+
+    for (const item of vocabulary) {
+      const original = item.original.trim();
+      const translation = item.translation.trim();
+      if (!original || !translation) continue;
+
+      const translations = translationsByOriginal.get(original);
+      if (translations) {
+        translations.add(translation);
+      } else {
+        translationsByOriginal.set(original, new Set([translation]));
+      }
+    }
+
+    return translationsByOriginal;
+  }
+
+  /**
+   * Build content-addressed key for an extraction of the given text
+   */
+  async buildExtractionKey(text: string, sourceLanguage: string): Promise<string> {
+    const payload = JSON.stringify([VOCAB_EXTRACTION.MODEL, VOCAB_EXTRACTION.PROMPT_VERSION, sourceLanguage, text]);
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(payload));
+    return Array.from(new Uint8Array(digest))
+      .map(byte => byte.toString(16).padStart(2, '0'))
+      .join('');
+  }
+
+  /**
+   * Get cached raw API extraction results for several content keys with a single storage read
+   */
+  async getExtractionResults(keys: string[]): Promise<Map<string, ExtractedVocab[]>> {
+    const results = new Map<string, ExtractedVocab[]>();
+    if (keys.length === 0) {
+      return results;
+    }
+
+    try {
+      const stored = await browser.storage.local.get(keys.map(key => `${this.extractionCacheKeyPrefix}${key}`));
+      const expiredKeys: string[] = [];
+
+      for (const key of keys) {
+        const cacheKey = `${this.extractionCacheKeyPrefix}${key}`;
+        if (!stored[cacheKey]) continue;
+
+        const entry = this.readStoredValue<ExtractionCacheEntry>(stored[cacheKey]);
+        if (this.isExtractionExpired(entry)) {
+          expiredKeys.push(cacheKey);
+        } else {
+          results.set(key, entry.response);
+        }
+      }
+
+      if (expiredKeys.length > 0) {
+        await browser.storage.local.remove(expiredKeys);
+      }
+    } catch (error) {
+      console.error('Error reading extraction cache:', error);
+    }
+
+    return results;
+  }
+
+  /**
+   * Cache raw API extraction results for several content keys with a single storage write
+   */
+  async cacheExtractionResults(responses: Map<string, ExtractedVocab[]>): Promise<void> {
+    if (responses.size === 0) {
+      return;
+    }
+
+    try {
+      const timestamp = new Date().toISOString();
+      const entries: Record<string, ExtractionCacheEntry> = {};
+
+      for (const [key, response] of responses) {
+        entries[`${this.extractionCacheKeyPrefix}${key}`] = {
+          model: VOCAB_EXTRACTION.MODEL,
+          promptVersion: VOCAB_EXTRACTION.PROMPT_VERSION,
+          response,
+          timestamp
+        };
+      }
+
+      await browser.storage.local.set(entries);
+    } catch (error) {
+      console.error('Error caching extraction results:', error);
+      // Non-fatal error, continue without caching
+    }
+  }
+
   /**
    * Clear segment cache (for error recovery)
    */
@@ -187,6 +357,98 @@ export class VocabCacheManager {
     }
   }
 
+  /**
+   * One-time removal of segment caches written before segments were merged; nothing reads them
+   * anymore and they would otherwise fill the storage quota
+   */
+  private async removeLegacySegmentCaches(): Promise<void> {
+    if (VocabCacheManager.legacyCleanupStarted) return;
+    VocabCacheManager.legacyCleanupStarted = true;
+
+    try {
+      const flag = await browser.storage.local.get([this.legacyCleanupDoneKey]);
+      if (flag[this.legacyCleanupDoneKey]) return;
+
+      const allEntries = await browser.storage.local.get(null);
+      const legacyKeys = Object.keys(allEntries).filter(key =>
+        key.startsWith(this.legacySegmentCacheKeyPrefix) && !key.startsWith(this.segmentCacheKeyPrefix)
+      );
+
+      if (legacyKeys.length > 0) {
+        await browser.storage.local.remove(legacyKeys);
+        console.log('Removed', legacyKeys.length, 'legacy segment vocabulary caches');
+      }
+      await browser.storage.local.set({ [this.legacyCleanupDoneKey]: new Date().toISOString() });
+    } catch (error) {
+      console.error('Error removing legacy segment caches:', error);
+      // Non-fatal error, cleanup is attempted again on the next page load
+    }
+  }
+
+  /**
+   * Remove expired extraction results, scanning storage at most once per prune interval
+   */
+  private async pruneExtractionCache(): Promise<void> {
+    if (VocabCacheManager.extractionPruneStarted) return;
+    VocabCacheManager.extractionPruneStarted = true;
+
+    try {
+      const lastPrune = await browser.storage.local.get([this.extractionPrunedAtKey]);
+      const prunedAt = lastPrune[this.extractionPrunedAtKey] as string | undefined;
+      if (prunedAt && Date.now() - new Date(prunedAt).getTime() < VOCAB_EXTRACTION.CACHE_PRUNE_INTERVAL) return;
+
+      const allEntries = await browser.storage.local.get(null);
+      const expiredKeys = Object.keys(allEntries).filter(key =>
+        key.startsWith(this.extractionCacheKeyPrefix)
+        && this.isExtractionExpired(this.readStoredValue<ExtractionCacheEntry>(allEntries[key]))
+      );
+
+      if (expiredKeys.length > 0) {
+        await browser.storage.local.remove(expiredKeys);
+        console.log('Removed', expiredKeys.length, 'expired extraction results');
+      }
+      await browser.storage.local.set({ [this.extractionPrunedAtKey]: new Date().toISOString() });
+    } catch (error) {
+      console.error('Error pruning extraction cache:', error);
+      // Non-fatal error, pruning is attempted again on the next page load
+    }
+  }
+
+  private isExtractionExpired(entry: ExtractionCacheEntry): boolean {
+    // Entries without a readable timestamp are treated as expired
+    const age = Date.now() - new Date(entry.timestamp).getTime();
+    return !(age < VOCAB_EXTRACTION.CACHE_MAX_AGE);
+  }
+
+  /**
+   * Values are stored as plain objects (browser storage serializes them itself);
+   * entries written by older versions were JSON strings
+   */
+  private readStoredValue<T>(value: unknown): T {
+    return (typeof value === 'string' ? JSON.parse(value) : value) as T;
+  }
+
+  /**
+   * Serialize vocabulary entry (including FSRS card) for storage
+   */
+  private serializeVocab(vocab: VocabItem): Record<string, unknown> {
+    return {
+      ...vocab,
+      fsrsCard: vocab.fsrsCard ? this.serializeCard(vocab.fsrsCard) : undefined
+    };
+  }
+
+  /**
+   * Deserialize vocabulary entry (including FSRS card) from storage
+   */
+  private deserializeVocab(value: unknown): VocabItem {
+    const vocab = this.readStoredValue<VocabItem>(value);
+    return {
+      ...vocab,
+      fsrsCard: vocab.fsrsCard ? this.deserializeCard(vocab.fsrsCard) : undefined
+    };
+  }
+
   /**
    * Serialize FSRS Card for storage
    */
@@ -1,135 +1,384 @@
-import type { VocabItem } from '../types/index.js';
+import type { VocabItem, ExtractedVocab } from '../types/index.js';
 import { ApiKeyManager } from './api-key-manager.js';
 import { VocabCacheManager } from './vocab-cache-manager.js';
+import { VOCAB_EXTRACTION } from '../config/constants.js';
+import { createConcurrencyLimiter } from '../utils/async-utils.js';
+import { logger } from '../utils/logger.js';
+import { hasSpokenText } from '../utils/subtitle-text.js';
+
+const OPENAI_CHAT_COMPLETIONS_URL = 'https://api.openai.com/v1/chat/completions';
+
+// Static instructions go into the system message so they form a shared prefix across requests
+// (eligible for OpenAI prompt caching); only the snippets vary per request
+const SYSTEM_PROMPT = `You are an expert in language teaching, specialized in vocabulary extraction. Always respond with valid JSON.
+
+You receive numbered subtitle snippets together with their language. Extract language learning vocabulary from each snippet.
+
+Guidelines:
+- Extract meaningful words and phrases that would be useful for language learners
+- Ignore music indicators like [موسيقى] or [music]
+- Extract even single words if they are meaningful vocabulary
+- Ignore proper nouns (names, places, brands), exclamations (oh, wow), and non-translatable words
+- For each extracted word/phrase, provide an English translation suitable for learning
+- Retain correct capitalization and spelling
+- Focus on common, everyday vocabulary that learners would encounter
+- Even if snippets are short, extract any meaningful vocabulary
+- Avoid comma-separated synonyms. Simply give the most fitting translation!
+- Only add the pure words/expressions themselves. Do not add notes or extra infos.
+- Treat every numbered snippet separately and include every number in your answer, even if it has no vocabulary
+
+Return your answer as a JSON object of the form {"results": [{"index": <snippet number>, "vocabulary": [{"original": ..., "translation": ...}]}]}.`;
+
+// JSON schema enforced through OpenAI structured outputs
+const EXTRACTION_RESPONSE_SCHEMA = {
+  type: 'object',
+  properties: {
+    results: {
+      type: 'array',
+      items: {
+        type: 'object',
+        properties: {
+          index: { type: 'integer' },
+          vocabulary: {
+            type: 'array',
+            items: {
+              type: 'object',
+              properties: {
+                original: { type: 'string' },
+                translation: { type: 'string' }
+              },
+              required: ['original', 'translation'],
+              additionalProperties: false
+            }
+          }
+        },
+        required: ['index', 'vocabulary'],
+        additionalProperties: false
+      }
+    }
+  },
+  required: ['results'],
+  additionalProperties: false
+};
+
+const EXTRACTION_RESPONSE_FORMAT = {
+  type: 'json_schema',
+  json_schema: {
+    name: 'vocabulary_extraction',
+    strict: true,
+    schema: EXTRACTION_RESPONSE_SCHEMA
+  }
+};
+
+interface ChatMessage {
+  role: 'system' | 'user' | 'assistant';
+  content: string;
+}
+
+export interface SubtitleSegment {
+  index: number;
+  text: string;
+}
 
 export class VocabExtractor {
   private cacheManager = new VocabCacheManager();
+  // Shared by all calls so prefetches and new requests together stay within the limit
+  private limitRequests = createConcurrencyLimiter(VOCAB_EXTRACTION.MAX_CONCURRENT_REQUESTS);
+  // Extractions still in flight, keyed by video and segment index, so no segment is requested twice
+  private pendingExtractions = new Map<string, Promise<void>>();
+  // Results are persisted one after another so concurrent batches don't race on shared storage entries
+  private persistQueue: Promise<void> = Promise.resolve();
+
+  /**
+   * Extract and cache vocabulary for the first segment; the following segments are batched
+   * and extracted in the background. Resolves once the first segment's vocabulary is cached.
+   */
+  async extractVocabularyForSegments(segments: SubtitleSegment[], sourceLanguage: string, videoId: string): Promise<void> {
+    if (segments.length === 0) {
+      return;
+    }
 
-  async extractVocabulary(subtitleText: string, sourceLanguage: string, videoId?: string, segmentIndex?: number): Promise<VocabItem[]> {
-    // Check cache first if video ID and segment index are provided
-    if (videoId && segmentIndex !== undefined) {
-      const cachedVocabulary = await this.cacheManager.getSegmentVocabulary(videoId, segmentIndex);
+    // Segments already being extracted are not requested again; the caller waits on the pending request
+    const newSegments = segments.filter(segment => !this.pendingExtractions.has(this.getPendingKey(videoId, segment.index)));
+    if (newSegments.length > 0) {
+      this.startExtraction(newSegments, sourceLanguage, videoId);
+    }
+
+    // Failures are logged where the pending extraction is registered
+    await this.pendingExtractions.get(this.getPendingKey(videoId, segments[0].index));
+  }
+
+  /**
+   * Register a pending extraction for every segment before any asynchronous work starts
+   */
+  private startExtraction(segments: SubtitleSegment[], sourceLanguage: string, videoId: string): void {
+    const plannedExtractions = this.planExtraction(segments, sourceLanguage, videoId);
+
+    for (const segment of segments) {
+      const pendingKey = this.getPendingKey(videoId, segment.index);
+      const pendingExtraction = plannedExtractions.then(extractions => extractions.get(segment.index));
+      this.pendingExtractions.set(pendingKey, pendingExtraction);
+
+      // Failed segments are dropped from the pending map so they are extracted again later
+      pendingExtraction
+        .catch(error => logger.error('Error extracting vocabulary for segment', segment.index, 'of video', videoId, ':', error))
+        .finally(() => {
+          if (this.pendingExtractions.get(pendingKey) === pendingExtraction) {
+            this.pendingExtractions.delete(pendingKey);
+          }
+        });
+    }
+  }
+
+  /**
+   * Start extraction for the given segments, returning the promise each segment's result is persisted by
+   */
+  private async planExtraction(segments: SubtitleSegment[], sourceLanguage: string, videoId: string): Promise<Map<number, Promise<void>>> {
+    // Subtitles repeat (choruses, filler phrases): look up and request each distinct text once
+    const segmentsByText = new Map<string, SubtitleSegment[]>();
+    for (const segment of segments) {
+      const textSegments = segmentsByText.get(segment.text);
+      if (textSegments) {
+        textSegments.push(segment);
+      } else {
+        segmentsByText.set(segment.text, [segment]);
+      }
+    }
+
+    // Only send texts that have no cached extraction result
+    const localVocabularyBySegment = new Map<number, ExtractedVocab[]>();
+    const uncachedSegments: SubtitleSegment[] = [];
+
+    // Cheap local check so music tags and letterless lines never reach the API
+    const spokenTexts: string[] = [];
+    for (const [text, textSegments] of segmentsByText) {
+      if (hasSpokenText(text)) {
+        spokenTexts.push(text);
+      } else {
+        textSegments.forEach(segment => localVocabularyBySegment.set(segment.index, []));
+      }
+    }
+
+    // Hash all texts concurrently, then look them up with one storage read
+    const keys = await Promise.all(spokenTexts.map(text => this.cacheManager.buildExtractionKey(text, sourceLanguage)));
+    const extractionKeys = new Map(spokenTexts.map((text, i) => [text, keys[i]]));
+    const cachedResults = await this.cacheManager.getExtractionResults(keys);
+
+    for (const text of spokenTexts) {
+      const textSegments = segmentsByText.get(text)!;
+      const cachedVocabulary = cachedResults.get(extractionKeys.get(text)!);
       if (cachedVocabulary) {
-        console.log(`Using cached vocabulary for video ${videoId}, segment ${segmentIndex}`);
-        return cachedVocabulary;
+        textSegments.forEach(segment => localVocabularyBySegment.set(segment.index, cachedVocabulary));
+      } else {
+        uncachedSegments.push(textSegments[0]);
       }
     }
-    const apiKey = await ApiKeyManager.getStoredKey();
-    if (!apiKey) {
-      throw new Error('OpenAI API key not found');
+
+    const extractions = new Map<number, Promise<void>>();
+
+    if (localVocabularyBySegment.size > 0) {
+      logger.debug('Using cached extractions for', localVocabularyBySegment.size, 'segments of video', videoId);
+      const localPersisted = this.enqueuePersist(() => this.persistSegmentsVocabulary(videoId, localVocabularyBySegment));
+      localVocabularyBySegment.forEach((_, index) => extractions.set(index, localPersisted));
     }
 
-    const prompt = this.buildPrompt(subtitleText, sourceLanguage);
+    for (const batch of this.splitIntoBatches(uncachedSegments)) {
+      // The caller waits for the first segment, so its batch goes ahead of queued prefetches
+      const isRequestedBatch = batch.some(segment => segment.index === segments[0].index);
+      const batchPersisted = this.limitRequests(() => this.requestBatchVocabulary(batch, sourceLanguage, videoId), isRequestedBatch)
+        .then(batchVocabulary => this.enqueuePersist(async () => {
+          const rawVocabularyBySegment = new Map<number, ExtractedVocab[]>();
+          const extractionResults = new Map<string, ExtractedVocab[]>();
 
-    try {
-      const response = await fetch('https://api.openai.com/v1/chat/completions', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${apiKey}`
-        },
-        body: JSON.stringify({
-          model: 'gpt-4o-mini',
-          messages: [
-            {
-              role: 'system',
-              content: 'You are a helpful assistant specialized in language learning and vocabulary extraction. Always respond with valid JSON.'
-            },
-            {
-              role: 'user',
-              content: prompt
+          for (const segment of batch) {
+            const rawVocabulary = batchVocabulary.get(segment.index);
+            // Don't persist lines the model skipped, so they are retried next time
+            if (rawVocabulary) {
+              extractionResults.set(extractionKeys.get(segment.text)!, rawVocabulary);
             }
-          ],
-          response_format: { type: 'json_object' }
-        })
-      });
+            segmentsByText.get(segment.text)!.forEach(textSegment => rawVocabularyBySegment.set(textSegment.index, rawVocabulary || []));
+          }
 
-      if (!response.ok) {
-        throw new Error(`OpenAI API error: ${response.status} ${response.statusText}`);
-      }
+          await this.cacheManager.cacheExtractionResults(extractionResults);
+          await this.persistSegmentsVocabulary(videoId, rawVocabularyBySegment);
+        }));
 
-      const data = await response.json();
-      const content = data.choices[0].message.content;
+      batch.forEach(segment => segmentsByText.get(segment.text)!.forEach(textSegment => extractions.set(textSegment.index, batchPersisted)));
+    }
 
-      console.log(`OpenAI Response for text: ${subtitleText}\n${content}\n`);
+    return extractions;
+  }
 
-      const parsed = JSON.parse(content);
-      const rawVocabulary = this.parseVocabularyResponse(parsed);
-      
-      // Process and enrich vocabulary through cache manager
-      const enrichedVocabulary = await this.cacheManager.processNewVocabulary(rawVocabulary);
-      
-      // Cache the segment vocabulary if video ID and segment index are provided
-      if (videoId && segmentIndex !== undefined) {
-        await this.cacheManager.cacheSegmentVocabulary(videoId, segmentIndex, enrichedVocabulary);
-      }
-      
-      return enrichedVocabulary;
+  /**
+   * Enrich raw vocabulary with the global cache and store it per segment.
+   * The global cache is merged once for all segments, then each segment gets its own entries back.
+   */
+  private async persistSegmentsVocabulary(videoId: string, rawVocabularyBySegment: Map<number, ExtractedVocab[]>): Promise<void> {
+    const enrichedVocabulary = await this.cacheManager.processNewVocabulary([...rawVocabularyBySegment.values()].flat());
+    const enrichedByOriginal = new Map(enrichedVocabulary.map(vocab => [vocab.original, vocab]));
 
-    } catch (error) {
-      console.error('Error extracting vocabulary:', error);
-      throw error;
+    const results = new Map<number, VocabItem[]>();
+    for (const [index, rawVocabulary] of rawVocabularyBySegment) {
+      // processNewVocabulary keys entries by trimmed original; keep each word once per segment
+      const originals = new Set(rawVocabulary.map(item => item.original.trim()));
+      const segmentVocabulary: VocabItem[] = [];
+      for (const original of originals) {
+        const vocab = enrichedByOriginal.get(original);
+        if (vocab) {
+          segmentVocabulary.push(vocab);
+        }
+      }
+      results.set(index, segmentVocabulary);
     }
+
+    await this.cacheManager.cacheSegmentsVocabulary(videoId, results);
   }
 
-  private buildPrompt(subtitleText: string, sourceLanguage: string): string {
-    return `You are an expert in language teaching.
+  private enqueuePersist(persist: () => Promise<void>): Promise<void> {
+    const persisted = this.persistQueue.then(persist);
+    // A failed write must not block the ones queued after it
+    this.persistQueue = persisted.catch(() => undefined);
+    return persisted;
+  }
 
-Extract language learning vocabulary from the following subtitle snippet in ${sourceLanguage} language.
+  private getPendingKey(videoId: string, segmentIndex: number): string {
+    return `${videoId}_${segmentIndex}`;
+  }
 
-Guidelines:
-- Extract meaningful words and phrases that would be useful for language learners
-- Ignore music indicators like [موسيقى] or [music]
-- Extract even single words if they are meaningful vocabulary
-- Ignore proper nouns (names, places, brands), exclamations (oh, wow), and non-translatable words
-- For each extracted word/phrase, provide an English translation suitable for learning
-- Retain correct capitalization and spelling
-- Focus on common, everyday vocabulary that learners would encounter
-- Even if snippets are short, extract any meaningful vocabulary
-- Avoid comma-separated synonyms. Simply give the most fitting translation!
-- Only add the pure words/expressions themselves. Do not add notes or extra infos.
+  /**
+   * Request vocabulary for one batch of segments, keyed by segment index
+   */
+  private async requestBatchVocabulary(segments: SubtitleSegment[], sourceLanguage: string, videoId: string): Promise<Map<number, ExtractedVocab[]>> {
+    logger.info('Requesting vocabulary for', segments.length, 'segments of video', videoId);
+    const rawVocabularyByLine = await this.requestVocabulary(this.buildUserPrompt(segments.map(segment => segment.text), sourceLanguage));
+    const rawVocabularyBySegment = new Map<number, ExtractedVocab[]>();
 
-Return your answer as a JSON array with objects containing 'original' and 'translation' fields.
+    segments.forEach((segment, i) => {
+      // Lines are numbered from 1 in the prompt
+      const rawVocabulary = rawVocabularyByLine.get(i + 1);
+      if (rawVocabulary) {
+        rawVocabularyBySegment.set(segment.index, rawVocabulary);
+      }
+    });
 
-Subtitle snippet to analyze:
-${subtitleText}`;
+    return rawVocabularyBySegment;
   }
 
-  private parseVocabularyResponse(parsed: unknown): Array<{ original: string; translation: string }> {
-    // Accept both array and object with 'vocabulary' or 'words' keys
-    if (Array.isArray(parsed)) {
-      return this.mapToVocabItems(parsed);
+  private splitIntoBatches(segments: SubtitleSegment[]): SubtitleSegment[][] {
+    const batches: SubtitleSegment[][] = [];
+    for (let i = 0; i < segments.length; i += VOCAB_EXTRACTION.BATCH_SIZE) {
+      batches.push(segments.slice(i, i + VOCAB_EXTRACTION.BATCH_SIZE));
     }
+    return batches;
+  }
 
-    if (typeof parsed === 'object' && parsed !== null) {
-      const obj = parsed as Record<string, unknown>;
+  /**
+   * Request vocabulary for numbered snippets, keyed by snippet number.
+   * Invalid answers are sent back to the model with the validation error and retried.
+   */
+  private async requestVocabulary(prompt: string): Promise<Map<number, ExtractedVocab[]>> {
+    const apiKey = await ApiKeyManager.getStoredKey();
+    if (!apiKey) {
+      throw new Error('OpenAI API key not found');
+    }
 
-      if ('vocabulary' in obj && Array.isArray(obj.vocabulary)) {
-        return this.mapToVocabItems(obj.vocabulary);
-      }
+    const messages: ChatMessage[] = [
+      { role: 'system', content: SYSTEM_PROMPT },
+      { role: 'user', content: prompt }
+    ];
+
+    for (let attempt = 0; ; attempt++) {
+      const content = await this.requestCompletion(apiKey, messages);
+      logger.debug('OpenAI Response:', content);
 
-      if ('words' in obj && Array.isArray(obj.words)) {
-        return this.mapToVocabItems(obj.words);
+      try {
+        return this.parseExtractionResponse(content);
+      } catch (error) {
+        if (attempt >= VOCAB_EXTRACTION.MAX_VALIDATION_RETRIES) {
+          throw new Error(`Invalid vocabulary response from OpenAI: ${(error as Error).message}`);
+        }
+
+        logger.warn('Invalid vocabulary response (attempt', attempt + 1, '), retrying:', (error as Error).message);
+        messages.push(
+          { role: 'assistant', content },
+          { role: 'user', content: `Your previous answer was invalid: ${(error as Error).message}. Answer again using exactly the required JSON format.` }
+        );
+        await new Promise(resolve => setTimeout(resolve, VOCAB_EXTRACTION.RETRY_BACKOFF_MS * (attempt + 1)));
       }
     }
+  }
+
+  private async requestCompletion(apiKey: string, messages: ChatMessage[]): Promise<string> {
+    const response = await fetch(OPENAI_CHAT_COMPLETIONS_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${apiKey}`
+      },
+      body: JSON.stringify({
+        model: VOCAB_EXTRACTION.MODEL,
+        messages,
+        response_format: EXTRACTION_RESPONSE_FORMAT
+      })
+    });
+
+    if (!response.ok) {
+      throw new Error(`OpenAI API error: ${response.status} ${response.statusText}`);
+    }
 
-    return [];
+    const data = await response.json();
+    const message = data.choices[0].message;
+
+    if (message.refusal) {
+      throw new Error(`OpenAI refused the request: ${message.refusal}`);
+    }
+
+    return message.content;
   }
 
-  private mapToVocabItems(items: unknown[]): Array<{ original: string; translation: string }> {
-    return items
-      .map(item => {
-        if (typeof item === 'object' && item !== null) {
-          const obj = item as Record<string, unknown>;
-          const original = obj.original || obj.word;
-          const translation = obj.translation;
+  private buildUserPrompt(texts: string[], sourceLanguage: string): string {
+    const numberedLines = texts.map((text, i) => `${i + 1}: ${text}`).join('\n');
 
-          if (typeof original === 'string' && typeof translation === 'string') {
-            return { original, translation };
-          }
+    return `Language: ${sourceLanguage}
+
+Subtitle snippets to analyze:
+${numberedLines}`;
+  }
+
+  /**
+   * Parse and validate a response matching EXTRACTION_RESPONSE_SCHEMA; throws a descriptive error otherwise
+   */
+  private parseExtractionResponse(content: string): Map<number, ExtractedVocab[]> {
+    const parsed = JSON.parse(content) as { results?: unknown } | null;
+    const results = parsed?.results;
+
+    if (!Array.isArray(results)) {
+      throw new Error('Expected a JSON object with a "results" array');
+    }
+
+    const vocabularyByLine = new Map<number, ExtractedVocab[]>();
+
+    for (const result of results) {
+      const { index, vocabulary } = (result ?? {}) as Record<string, unknown>;
+
+      if (typeof index !== 'number' || !Number.isInteger(index)) {
+        throw new Error('Every result needs an integer "index"');
+      }
+      if (!Array.isArray(vocabulary)) {
+        throw new Error(`Result ${index} needs a "vocabulary" array`);
+      }
+
+      const items = vocabulary.map(item => {
+        const { original, translation } = (item ?? {}) as Record<string, unknown>;
+        if (typeof original !== 'string' || typeof translation !== 'string') {
+          throw new Error(`Vocabulary of result ${index} must only contain objects with string "original" and "translation" fields`);
         }
-        return null;
-      })
-      .filter((item): item is { original: string; translation: string } => item !== null);
+        return { original, translation };
+      });
+
+      vocabularyByLine.set(index, [...(vocabularyByLine.get(index) || []), ...items]);
+    }
+
+    return vocabularyByLine;
   }
 }
\ No newline at end of file
@@ -14,6 +14,18 @@ export interface VocabItem {
   lastPicked?: string;       // Track for consecutive duplicate prevention
 }
 
+export interface ExtractedVocab {
+  original: string;
+  translation: string;
+}
+
+export interface ExtractionCacheEntry {
+  model: string;
+  promptVersion: string;
+  response: ExtractedVocab[];
+  timestamp: string;         // When cached
+}
+
 export interface SegmentVocabCache {
   videoId: string;
   segmentIndex: number;
@@ -36,6 +48,11 @@ export interface CaptionTrack {
   };
 }
 
+export interface CaptionMetadata {
+  captionTracks: CaptionTrack[];
+  defaultAudioLanguage: string | null;
+}
+
 export interface YouTubeHelpers {
   getToken(): string | null;
   setToken(token: string): void;
@@ -76,3 +93,5 @@ export interface POTTokenManager {
   getToken(): string | null;
   setToken(token: string): void;
 }
+
+export type LogLevel = 'debug' | 'info' | 'warn' | 'error';
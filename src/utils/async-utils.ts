@@ -0,0 +1,41 @@
+/**
+ * Helpers for running asynchronous work with bounded concurrency
+ */
+
+export type ConcurrencyLimiter = <T>(task: () => Promise<T>, urgent?: boolean) => Promise<T>;
+
+/**
+ * Creates a limiter that runs at most `limit` tasks at once; further tasks wait in FIFO order.
+ * Urgent tasks skip ahead of the waiting ones. Each call resolves or rejects with its own task's result.
+ */
+export function createConcurrencyLimiter(limit: number): ConcurrencyLimiter {
+  const waiting: Array<() => void> = [];
+  let running = 0;
+
+  const startNext = (): void => {
+    if (running >= Math.max(1, limit)) return;
+    const next = waiting.shift();
+    if (next) {
+      running++;
+      next();
+    }
+  };
+
+  return <T>(task: () => Promise<T>, urgent = false): Promise<T> => new Promise<T>((resolve, reject) => {
+    const start = (): void => {
+      Promise.resolve().then(task)
+        .then(resolve, reject)
+        .finally(() => {
+          running--;
+          startNext();
+        });
+    };
+
+    if (urgent) {
+      waiting.unshift(start);
+    } else {
+      waiting.push(start);
+    }
+    startNext();
+  });
+}
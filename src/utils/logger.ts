@@ -0,0 +1,36 @@
+import { LOGGING } from '../config/constants.js';
+import type { LogLevel } from '../types/index.js';
+
+/**
+ * Leveled console logging. Arguments are passed through unformatted, so messages below the
+ * active level cost no string building or console I/O.
+ */
+
+const LOG_LEVEL_ORDER: Record<LogLevel, number> = {
+  debug: 0,
+  info: 1,
+  warn: 2,
+  error: 3
+};
+
+const ACTIVE_LEVEL: LogLevel = LOGGING.LEVEL;
+
+const isEnabled = (level: LogLevel): boolean => LOG_LEVEL_ORDER[level] >= LOG_LEVEL_ORDER[ACTIVE_LEVEL];
+
+export const logger = {
+  debug(...args: unknown[]): void {
+    if (isEnabled('debug')) console.debug(...args);
+  },
+
+  info(...args: unknown[]): void {
+    if (isEnabled('info')) console.info(...args);
+  },
+
+  warn(...args: unknown[]): void {
+    if (isEnabled('warn')) console.warn(...args);
+  },
+
+  error(...args: unknown[]): void {
+    if (isEnabled('error')) console.error(...args);
+  }
+};
@@ -0,0 +1,15 @@
+/**
+ * Helpers for telling spoken subtitle text apart from sound tags and symbols
+ */
+
+// Sound tags such as [موسيقى], [Music] or [Applause], possibly several in one line
+const SOUND_TAG_PATTERN = /\[[^\]]{1,20}\]/g;
+// Text without any letter (♪, punctuation, numbers) carries no vocabulary
+const LETTER_PATTERN = /\p{L}/u;
+
+/**
+ * Whether a subtitle line contains any words besides sound tags
+ */
+export function hasSpokenText(text: string): boolean {
+  return LETTER_PATTERN.test(text.replace(SOUND_TAG_PATTERN, ''));
+}
@@ -1,5 +1,6 @@
 import type { POTTokenManager, CaptionTrack } from '../types/index.js';
 import browser from 'webextension-polyfill';
+import { logger } from './logger.js';
 
 export class YouTubeHelpers {
   static initializePOTTokenCapture(): POTTokenManager {
@@ -8,14 +9,14 @@ export class YouTubeHelpers {
     const script = document.createElement('script');
     script.src = browser.runtime.getURL('injected.js');
     script.onload = (): void => {
-      console.log('[Content Script] injected.js loaded');
+      logger.debug('[Content Script] injected.js loaded');
       script.remove();
     };
     (document.head || document.documentElement).appendChild(script);
 
     window.addEventListener('FoundPOT', (event) => {
       poToken = event.detail;
-      console.log('[Content Script] POT token found:', poToken);
+      logger.debug('[Content Script] POT token found:', poToken);
     });
 
     return {
@@ -45,7 +46,19 @@ export class YouTubeHelpers {
 
   static async fetchVideoPage(videoId: string): Promise<string> {
     const url = 'https://www.youtube.com/watch?v=' + videoId;
-    return fetch(url).then(resp => resp.text());
+    const resp = await fetch(url);
+    if (!resp.ok) {
+      throw new Error(`Failed to load video page. Status: ${resp.status}`);
+    }
+    return resp.text();
+  }
+
+  /**
+   * Whether the page holds a playable player response without any captions block,
+   * i.e. the video really has no subtitles (as opposed to consent pages or changed markup)
+   */
+  static isPlayableWithoutCaptions(html: string): boolean {
+    return /"playabilityStatus":\{"status":"OK"/.test(html) && !html.includes('"captions":');
   }
 
   static extractCaptionTracks(html: string): CaptionTrack[] | null {
@@ -57,17 +70,17 @@ export class YouTubeHelpers {
   static extractDefaultAudioLanguage(html: string): string | null {
     const defaultAudioMatch = html.match(/"defaultAudioLanguage":"(.*?)"/);
     if (defaultAudioMatch?.[1]) {
-      console.log('[YouTubeHelpers] Found defaultAudioLanguage:', defaultAudioMatch[1]);
+      logger.debug('[YouTubeHelpers] Found defaultAudioLanguage:', defaultAudioMatch[1]);
       return defaultAudioMatch[1];
     }
 
     const microformatMatch = html.match(/"playerMicroformatRenderer":\{[^}]*"language":"(.*?)"/);
     if (microformatMatch?.[1]) {
-      console.log('[YouTubeHelpers] Falling back to microformat language:', microformatMatch[1]);
+      logger.debug('[YouTubeHelpers] Falling back to microformat language:', microformatMatch[1]);
       return microformatMatch[1];
     }
 
-    console.log('[YouTubeHelpers] No default audio language detected in HTML');
+    logger.debug('[YouTubeHelpers] No default audio language detected in HTML');
     return null;
   }
 